@@ -0,0 +1,111 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class AdmissionRejected(Exception):
+    """La cola de admisión está saturada; el cliente debe reintentar más tarde."""
+
+    def __init__(self, queue_depth, retry_after):
+        super().__init__(f"Cola del solver saturada ({queue_depth} en espera)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limita los cupos simultáneos del solver (en núcleos) y acota la cola de espera.
+    Una corrida ocupa un cupo; una que usa varios procesos (Monte Carlo) ocupa uno
+    por núcleo. Cuando no hay cupos libres y la cola está llena, rechaza de
+    inmediato con AdmissionRejected en lugar de acumular trabajo.
+    """
+
+    def __init__(self, max_concurrent, max_queue, retry_after=5):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._released = asyncio.Condition()
+        self.in_use = 0
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, weight=1):
+        weight = max(1, min(weight, self.max_concurrent))
+        if self.in_use + weight > self.max_concurrent and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.queued, self.retry_after)
+
+        self.queued += 1
+        try:
+            async with self._released:
+                await self._released.wait_for(lambda: self.in_use + weight <= self.max_concurrent)
+                self.in_use += weight
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            async with self._released:
+                self.in_use -= weight
+                self._released.notify_all()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "cores_in_use": self.in_use,
+            "queue_depth": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class SingleFlight:
+    """
+    Coalescencia de peticiones: las llamadas con la misma clave mientras hay una
+    en curso comparten una única ejecución y su resultado (o su excepción).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            # La tarea es independiente de la petición que la originó: si ese
+            # cliente se desconecta, los demás siguen esperando el mismo resultado.
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcamos la excepción como consumida aunque todos los clientes se hayan ido
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+
+# Instancias compartidas por los endpoints del solver (configurables por entorno)
+solver_admission = AdmissionController(
+    max_concurrent=int(os.getenv("SOLVER_MAX_CONCURRENT", os.cpu_count() or 1)),
+    max_queue=int(os.getenv("SOLVER_MAX_QUEUE", "32")),
+    retry_after=int(os.getenv("SOLVER_RETRY_AFTER", "5")),
+)
+curve_flight = SingleFlight()
@@ -10,7 +10,22 @@ load_dotenv()
 # Motor asincrónico para PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+# Pool de conexiones configurable por entorno (se crea una sola vez por proceso)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes"),
+    future=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    # Ping por checkout (un round-trip extra): solo si hay conexiones que se cortan ociosas
+    pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes"),
+)
+
+# Fábrica de sesiones compartida por todos los endpoints
+async_session = sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False
+)
 
 
 async def init_db():
@@ -25,8 +40,5 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     Se cambia el type hint a AsyncGenerator para evitar errores de Pylance,
     ya que la función usa 'yield'.
     """
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
     async with async_session() as session:
         yield session
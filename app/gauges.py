@@ -0,0 +1,124 @@
+import zlib
+
+import numpy as np
+
+# Ancho de cada partición temporal del almacenamiento crudo (días)
+PARTITION_DAYS = 1.0
+# Resolución de la serie decimada en tiempo logarítmico
+BINS_PER_DECADE = 20
+
+
+def encode_column(values, delta=False):
+    """
+    Codifica una columna float64 en forma compacta: delta opcional (tiempos casi
+    equiespaciados), byte-shuffle para agrupar bytes similares y compresión zlib.
+    """
+    values = np.ascontiguousarray(values, dtype="<f8")
+    if delta and len(values):
+        values = np.concatenate([values[:1], np.diff(values)])
+    shuffled = values.view(np.uint8).reshape(-1, 8).T.copy()
+    return zlib.compress(shuffled.tobytes(), 6)
+
+
+def decode_column(blob, delta=False):
+    raw = np.frombuffer(zlib.decompress(blob), dtype=np.uint8)
+    values = raw.reshape(8, -1).T.copy().view("<f8").ravel()
+    if delta:
+        values = np.cumsum(values)
+    return values
+
+
+def parse_csv_block(text, header=False):
+    """
+    Convierte líneas 'tiempo,presión' en un array (n, 2). Cada línea debe tener
+    exactamente dos columnas numéricas; con header=True (primer bloque del cuerpo)
+    se ignora una primera línea no numérica como encabezado.
+    """
+    lines = text.strip()
+    if not lines:
+        return np.empty((0, 2))
+    first_line = 1
+    if header:
+        first, _, rest = lines.partition("\n")
+        if any(c.isalpha() for c in first) and not _is_numeric_row(first):
+            lines, first_line = rest, 2
+    rows = []
+    for n_line, line in enumerate(lines.splitlines(), first_line):
+        if not line.strip():
+            continue
+        cols = line.split(",")
+        if len(cols) != 2:
+            raise ValueError(f"Línea {n_line}: se esperaban 2 columnas (tiempo,presión) y hay {len(cols)}")
+        try:
+            rows.append((float(cols[0]), float(cols[1])))
+        except ValueError:
+            raise ValueError(f"Línea {n_line}: valor no numérico '{line.strip()}'")
+    return check_finite(np.array(rows, dtype=float).reshape(-1, 2))
+
+
+def _is_numeric_row(line):
+    try:
+        [float(col) for col in line.split(",")]
+    except ValueError:
+        return False
+    return True
+
+
+def check_finite(values):
+    """Rechaza NaN e infinitos (el texto 'nan'/'inf' y los float64 binarios los admiten)."""
+    bad = ~np.isfinite(values).all(axis=1)
+    if bad.any():
+        raise ValueError(f"{int(bad.sum())} mediciones con valores no finitos (NaN o infinito)")
+    return values
+
+
+def partition_index(t_days):
+    return np.floor(np.asarray(t_days) / PARTITION_DAYS).astype(int)
+
+
+def log_bin_sums(t_days, pressure):
+    """
+    Acumula los puntos en bins de log10(t). Devuelve (bins, n, sum_t, sum_p) para que
+    la decimación se actualice de forma incremental sumando sobre lo ya almacenado.
+    """
+    t_days = np.asarray(t_days, dtype=float)
+    positive = t_days > 0
+    t_pos, p_pos = t_days[positive], np.asarray(pressure, dtype=float)[positive]
+    if len(t_pos) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0), np.empty(0)
+    bins = np.floor(np.log10(t_pos) * BINS_PER_DECADE).astype(int)
+    unique, inverse = np.unique(bins, return_inverse=True)
+    n = np.bincount(inverse)
+    sum_t = np.bincount(inverse, weights=t_pos)
+    sum_p = np.bincount(inverse, weights=p_pos)
+    return unique, n, sum_t, sum_p
+
+
+def bourdet_derivative(t_days, delta_p, smoothing=0.1):
+    """
+    Derivada de Bourdet d(Δp)/d(ln t) con ventana de suavizado `smoothing` (ciclos de ln t).
+    Para cada punto se toman los vecinos más cercanos a una distancia >= smoothing a cada lado.
+    """
+    x = np.log(np.asarray(t_days, dtype=float))
+    y = np.asarray(delta_p, dtype=float)
+    n = len(x)
+    if n < 3:
+        return np.zeros(n)
+
+    idx = np.arange(n)
+    left = np.clip(np.searchsorted(x, x - smoothing, side="right") - 1, 0, None)
+    left = np.minimum(left, idx - 1)
+    right = np.clip(np.searchsorted(x, x + smoothing, side="left"), None, n - 1)
+    right = np.maximum(right, idx + 1)
+
+    deriv = np.zeros(n)
+    inner = (idx > 0) & (idx < n - 1)
+    i, j, k = idx[inner], left[inner], right[inner]
+    dx_l, dx_r = x[i] - x[j], x[k] - x[i]
+    slope_l, slope_r = (y[i] - y[j]) / dx_l, (y[k] - y[i]) / dx_r
+    deriv[inner] = (slope_l * dx_r + slope_r * dx_l) / (dx_l + dx_r)
+
+    # Extremos: diferencia unilateral
+    deriv[0] = (y[1] - y[0]) / (x[1] - x[0])
+    deriv[-1] = (y[-1] - y[-2]) / (x[-1] - x[-2])
+    return deriv
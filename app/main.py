@@ -1,6 +1,15 @@
+import time
+
+# Referencia para medir el arranque en frío (antes de las importaciones pesadas)
+_T0 = time.perf_counter()
+
 from fastapi import FastAPI
-from app.database import init_db
-from app.routes import project, simulation
+from app.database import init_db, async_session
+from app.concurrency import solver_admission, curve_flight
+from app.startup import StartupTracker, FirstRequestTimer, prewarm_solver
+from app.routes import project, simulation, gauges
+
+startup_tracker = StartupTracker(_T0)
 
 app = FastAPI(
     title="Reservoir Multi-Well API (SPE-215031-PA)",
@@ -11,10 +20,26 @@ app = FastAPI(
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    await prewarm_solver(async_session, startup_tracker)
+    startup_tracker.mark_ready()
+
+# ASGI puro: sin el costo de BaseHTTPMiddleware en cada petición
+app.add_middleware(FirstRequestTimer, tracker=startup_tracker)
 
 app.include_router(project.router)
 app.include_router(simulation.router)
+app.include_router(gauges.router)
 
 @app.get("/health", tags=["Infraestructura"])
 async def health_check():
-    return {"status": "online", "model": "SPE-215031-PA"}
\ No newline at end of file
+    return {"status": "online", "model": "SPE-215031-PA"}
+
+@app.get("/metrics/solver", tags=["Infraestructura"])
+async def solver_metrics():
+    """Estado de la cola de admisión del solver y de la coalescencia de peticiones."""
+    return {"admission": solver_admission.stats(), "coalescing": curve_flight.stats()}
+
+@app.get("/metrics/startup", tags=["Infraestructura"])
+async def startup_metrics():
+    """Tiempo de arranque en frío, pre-calentamiento y latencia de la primera petición."""
+    return startup_tracker.stats()
@@ -1,4 +1,5 @@
 from typing import List, Optional
+from sqlalchemy import Column, LargeBinary, UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 
 # --- MODELO DE PROYECTO (Reservorio y ORV) ---
@@ -78,4 +79,39 @@ class ProductionSchedule(SQLModel, table=True):
     rate_stbd: Optional[float] = Field(default=None, description="Oil rate (STB/D)")
     pwf_psi: Optional[float] = Field(default=None, description="Bottomhole flowing pressure (psi)")
 
-    well: Well = Relationship(back_populates="schedules")
\ No newline at end of file
+    well: Well = Relationship(back_populates="schedules")
+
+
+# --- MEDICIONES DE ALTA FRECUENCIA (SENSORES DE FONDO) ---
+
+class GaugePartition(SQLModel, table=True):
+    """
+    Partición temporal de la serie cruda de presión de fondo de un pozo.
+    Cada columna (tiempo, presión) se guarda comprimida por separado (ver app.gauges).
+    """
+    __table_args__ = (UniqueConstraint("well_id", "partition"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    well_id: int = Field(foreign_key="well.id", index=True)
+    partition: int = Field(index=True, description="Índice de la partición (floor(t / PARTITION_DAYS))")
+    t_start: float = Field(description="Primer tiempo de la partición (days)")
+    t_end: float = Field(description="Último tiempo de la partición (days)")
+    n_points: int = Field(description="Cantidad de mediciones")
+    time_data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    pressure_data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
+class GaugeLogBin(SQLModel, table=True):
+    """
+    Serie decimada en tiempo logarítmico, actualizada en cada ingesta con sumas
+    acumuladas, junto con la derivada de Bourdet suavizada.
+    """
+    __table_args__ = (UniqueConstraint("well_id", "bin"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    well_id: int = Field(foreign_key="well.id", index=True)
+    bin: int = Field(description="floor(log10(t) * BINS_PER_DECADE)")
+    n_points: int
+    sum_t: float
+    sum_p: float
+    derivative: Optional[float] = Field(default=None, description="Derivada de Bourdet (psi)")
@@ -0,0 +1,278 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+from app.solver import TrilinearSolver
+
+# Propiedades inciertas admitidas y a qué entidad pertenecen
+WELL_PROPERTIES = ("k_fi", "xf", "kf", "sigma_i", "spacing")
+PROJECT_PROPERTIES = ("initial_pressure",)
+SAMPLEABLE_PROPERTIES = WELL_PROPERTIES + PROJECT_PROPERTIES
+
+# Procesos del pool compartido: nunca más que los núcleos de la máquina
+MAX_WORKERS = os.cpu_count() or 1
+
+# Resolución del histograma de cuantiles y muestras del piloto que fija su rango
+QUANTILE_BINS = 512
+PILOT_SAMPLES = 200
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def effective_workers(n_workers=None):
+    """Cantidad de procesos que usará una corrida (acotada por los núcleos disponibles)."""
+    return max(1, min(n_workers or MAX_WORKERS, MAX_WORKERS))
+
+
+def _get_pool():
+    """
+    Pool de procesos único por servidor. Se usa forkserver (o spawn donde no existe)
+    para no hacer fork de un proceso con hilos y un event loop en ejecución.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Descarta un pool roto (un proceso murió) para que la próxima corrida cree uno nuevo."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def check_distributions(distributions):
+    """
+    Valida las propiedades muestreadas. Todas son magnitudes físicas positivas, así que
+    las distribuciones con soporte no positivo deben acotarse con low > 0.
+    Devuelve la lista de errores (vacía si todo es válido).
+    """
+    errors = []
+    unknown = sorted(set(distributions) - set(SAMPLEABLE_PROPERTIES))
+    if unknown:
+        errors.append(f"Propiedades no muestreables: {', '.join(unknown)}. "
+                      f"Admitidas: {', '.join(SAMPLEABLE_PROPERTIES)}")
+    for name, d in distributions.items():
+        if name in unknown:
+            continue
+        if d["dist"] != "lognormal" and (d.get("low") is None or d["low"] <= 0):
+            errors.append(f"'{name}' debe ser positiva: la distribución '{d['dist']}' requiere low > 0")
+    return errors
+
+
+def _truncated_normal(rng, mu, sigma, low, high, size):
+    """Normal truncada a [low, high] por inversa de la CDF (sin acumular masa en los bordes)."""
+    a = ndtr((low - mu) / sigma) if low is not None else 0.0
+    b = ndtr((high - mu) / sigma) if high is not None else 1.0
+    if b <= a:
+        raise ValueError("El rango [low, high] no tiene probabilidad bajo la distribución indicada")
+    return mu + sigma * ndtri(rng.uniform(a, b, size))
+
+
+def draw_samples(rng, distributions, size):
+    """
+    Muestrea cada propiedad incierta según su distribución.
+    distributions: dict propiedad -> dict con 'dist' y sus parámetros (ver schemas.ParameterDistribution).
+    """
+    samples = {}
+    for name, d in distributions.items():
+        kind = d["dist"]
+        low, high = d.get("low"), d.get("high")
+        if kind == "normal":
+            values = _truncated_normal(rng, d["mean"], d["std"], low, high, size)
+        elif kind == "lognormal":
+            # mean/std se dan en unidades reales; se convierten a los de ln(x)
+            sigma2 = np.log(1.0 + (d["std"] / d["mean"]) ** 2)
+            log_low = np.log(low) if low is not None and low > 0 else None
+            log_high = np.log(high) if high is not None else None
+            values = np.exp(_truncated_normal(rng, np.log(d["mean"]) - sigma2 / 2.0, np.sqrt(sigma2),
+                                              log_low, log_high, size))
+        elif kind == "uniform":
+            values = rng.uniform(d["low"], d["high"], size)
+        elif kind == "triangular":
+            values = rng.triangular(d["low"], d["mode"], d["high"], size)
+        else:
+            raise ValueError(f"Distribución no soportada: {kind}")
+        samples[name] = values
+    return samples
+
+
+class BinnedQuantiles:
+    """
+    Cuantiles por celda a partir de un histograma de bins fijos. A diferencia de P²,
+    el estado es sumable: cada proceso arma el histograma de su lote y el proceso
+    principal solo suma conteos. El rango de los bins sale de una muestra piloto
+    (ampliado un 10% por lado); lo que cae fuera va a dos bins de desborde acotados
+    por el mínimo y el máximo observados, así que el cuantil nunca sale de los datos.
+    """
+
+    def __init__(self, lo, hi, n_bins=QUANTILE_BINS, dtype=np.int64):
+        self.lo = np.asarray(lo, dtype=float)
+        self.hi = np.asarray(hi, dtype=float)
+        self.n_bins = n_bins
+        # Celdas sin dispersión en el piloto: ancho mínimo para no dividir por cero
+        self.width = np.maximum((self.hi - self.lo) / n_bins, 1e-9)
+        self.counts = np.zeros(self.lo.shape + (n_bins + 2,), dtype=dtype)
+        self.vmin = np.full(self.lo.shape, np.inf)
+        self.vmax = np.full(self.lo.shape, -np.inf)
+        self.count = 0
+
+    @classmethod
+    def from_pilot(cls, values, n_bins=QUANTILE_BINS):
+        lo, hi = values.min(axis=0), values.max(axis=0)
+        pad = 0.1 * (hi - lo)
+        return cls(lo - pad, hi + pad, n_bins)
+
+    def add(self, values):
+        """Incorpora un lote de observaciones con forma (muestras,) + forma de celdas."""
+        n_slots = self.n_bins + 2
+        idx = np.clip(np.floor((values - self.lo) / self.width) + 1, 0, n_slots - 1).astype(np.int64)
+        flat = idx + np.arange(self.lo.size).reshape(self.lo.shape) * n_slots
+        self.counts += np.bincount(flat.ravel(), minlength=self.counts.size).reshape(self.counts.shape).astype(self.counts.dtype)
+        self.vmin = np.minimum(self.vmin, values.min(axis=0))
+        self.vmax = np.maximum(self.vmax, values.max(axis=0))
+        self.count += len(values)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.vmin = np.minimum(self.vmin, other.vmin)
+        self.vmax = np.maximum(self.vmax, other.vmax)
+        self.count += other.count
+
+    def result(self, probs):
+        """Cuantiles con forma (n_cuantiles,) + forma de celdas (interpolación lineal dentro del bin)."""
+        cum = np.cumsum(self.counts, axis=-1)
+        out = []
+        for p in probs:
+            target = p * self.count
+            k = np.minimum(np.sum(cum < target, axis=-1), self.n_bins + 1)
+            n_k = np.take_along_axis(self.counts, k[..., None], axis=-1)[..., 0]
+            before = np.take_along_axis(cum, k[..., None], axis=-1)[..., 0] - n_k
+            left = np.where(k == 0, self.vmin, self.lo + (k - 1) * self.width)
+            right = np.where(k == self.n_bins + 1, self.vmax, self.lo + k * self.width)
+            left, right = np.clip(left, self.vmin, self.vmax), np.clip(right, self.vmin, self.vmax)
+            frac = np.divide(target - before, n_k, out=np.zeros(k.shape), where=n_k > 0)
+            out.append(left + np.clip(frac, 0.0, 1.0) * (right - left))
+        return np.stack(out)
+
+
+def snapshot_inputs(project, wells, schedules_map):
+    """Copia plana y serializable (pickle) de los datos ORM para los procesos de trabajo."""
+    project_data = SimpleNamespace(**project.model_dump())
+    wells_data = [SimpleNamespace(**w.model_dump()) for w in wells]
+    schedules_data = {
+        well_id: [SimpleNamespace(time_days=s.time_days, rate_stbd=s.rate_stbd) for s in scheds]
+        for well_id, scheds in schedules_map.items()
+    }
+    return project_data, wells_data, schedules_data
+
+
+def _evaluate_batch(inputs, days_list, distributions, seed_seq, size, n_stehfest, bounds=None):
+    """
+    Unidad de trabajo: muestrea un lote con su propia semilla y lo evalúa vectorizado.
+    Sin `bounds` (piloto) devuelve los valores crudos; con `bounds` devuelve el
+    histograma del lote y la suma por celda, ya reducidos dentro del proceso.
+    Celdas: (pwf | delta_p, pozo, tiempo).
+    """
+    project, wells, schedules = inputs
+    rng = np.random.default_rng(seed_seq)
+    samples = draw_samples(rng, distributions, size)
+    solver = TrilinearSolver(project, wells, schedules)
+    pwf, p_init = solver.calculate_pwf_samples(days_list, samples, n_stehfest)
+    cells = np.stack([pwf, p_init[:, None, None] - pwf], axis=1)
+    if bounds is None:
+        return cells
+    # uint16 alcanza: un lote tiene como mucho 5000 muestras (ver schemas.MonteCarloRequest)
+    sketch = BinnedQuantiles(*bounds, dtype=np.uint16)
+    sketch.add(cells)
+    return sketch, cells.sum(axis=0)
+
+
+def _map_batches(jobs, n_workers):
+    """
+    Evalúa los lotes en orden. Con varios procesos mantiene una ventana de n_workers
+    lotes en vuelo sobre el pool compartido: la corrida no ocupa más núcleos de los
+    reservados y la memoria no crece con n_samples.
+    """
+    if n_workers == 1 or len(jobs) == 1:
+        for job in jobs:
+            yield _evaluate_batch(*job)
+        return
+
+    pool = _get_pool()
+    try:
+        pending = []
+        for job in jobs:
+            pending.append(pool.submit(_evaluate_batch, *job))
+            if len(pending) >= n_workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+def run_monte_carlo(inputs, days_list, distributions, n_samples=1000, batch_size=100,
+                    seed=None, n_workers=None, percentiles=(10, 50, 90), n_stehfest=12):
+    """
+    Pronóstico probabilístico: evalúa n_samples muestras en lotes vectorizados,
+    repartidos entre procesos, y reduce a curvas de cuantiles por tiempo.
+
+    Los percentiles siguen la convención de reservas (P90 = valor superado por el
+    90% de las muestras, es decir, el cuantil estadístico 0.10).
+    Cada lote usa una semilla derivada de `seed` (SeedSequence.spawn), así que el
+    resultado es reproducible e independiente de la cantidad de procesos. Si no se
+    indica `seed`, se devuelve la entropía usada para poder repetir la corrida.
+
+    Los primeros lotes (al menos PILOT_SAMPLES muestras) fijan el rango de los
+    histogramas de cuantiles; el resto se reduce dentro de cada proceso y el
+    principal solo suma histogramas, así que la reducción también escala con n_workers.
+    """
+    probs = [1.0 - pct / 100.0 for pct in percentiles]
+
+    sizes = [batch_size] * (n_samples // batch_size)
+    if n_samples % batch_size:
+        sizes.append(n_samples % batch_size)
+    root_seed = np.random.SeedSequence(seed)
+    seeds = root_seed.spawn(len(sizes))
+    n_pilot = min(len(sizes), -(-PILOT_SAMPLES // batch_size))
+    n_workers = effective_workers(n_workers)
+
+    pilot_jobs = [(inputs, days_list, distributions, seed_seq, size, n_stehfest)
+                  for size, seed_seq in zip(sizes[:n_pilot], seeds[:n_pilot])]
+    pilot = np.concatenate(list(_map_batches(pilot_jobs, n_workers)))
+    sketch = BinnedQuantiles.from_pilot(pilot)
+    sketch.add(pilot)
+    totals = pilot.sum(axis=0)
+
+    bounds = (sketch.lo, sketch.hi)
+    jobs = [(inputs, days_list, distributions, seed_seq, size, n_stehfest, bounds)
+            for size, seed_seq in zip(sizes[n_pilot:], seeds[n_pilot:])]
+    for batch_sketch, batch_sum in _map_batches(jobs, n_workers):
+        sketch.merge(batch_sketch)
+        totals += batch_sum
+
+    quantiles = sketch.result(probs)
+    means = totals / n_samples
+    curves = {}
+    for i, well in enumerate(inputs[1]):
+        curves[well.name] = {}
+        for c, key in enumerate(("pwf", "delta_p")):
+            curves[well.name][key] = {f"P{pct}": quantiles[j, c, i].round(2).tolist()
+                                      for j, pct in enumerate(percentiles)}
+            curves[well.name][key]["mean"] = means[c, i].round(2).tolist()
+
+    return {"time": list(days_list), "n_samples": n_samples, "seed": root_seed.entropy, "curves": curves}
@@ -0,0 +1,298 @@
+import asyncio
+from typing import Literal, Optional
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select, func
+
+from app.database import get_session
+from app.models import Project, Well, GaugePartition, GaugeLogBin
+from app.solver import TrilinearSolver
+from app.gauges import (
+    encode_column, decode_column, parse_csv_block, check_finite, partition_index, log_bin_sums, bourdet_derivative
+)
+from app.concurrency import AdmissionRejected, solver_admission
+from app.routes.simulation import load_project_with_schedules, too_busy, choose_engine
+
+router = APIRouter(prefix="/gauges", tags=["Mediciones"])
+
+# Puntos acumulados en memoria antes de escribir a la base (acota la memoria de la ingesta)
+FLUSH_POINTS = 1_000_000
+
+
+async def _get_well(well_id: int, session: AsyncSession):
+    db_well = await session.get(Well, well_id)
+    if not db_well:
+        raise HTTPException(status_code=404, detail="Pozo no encontrado")
+    return db_well
+
+
+async def _store_batch(session: AsyncSession, well_id: int, data: np.ndarray, last_t: Optional[float]):
+    """Escribe un lote ordenado en sus particiones y actualiza los bins logarítmicos."""
+    data = data[np.argsort(data[:, 0], kind="stable")]
+    t, p = data[:, 0], data[:, 1]
+    if last_t is not None and t[0] <= last_t:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Las mediciones deben ser posteriores a las ya cargadas (último tiempo: {last_t} días)"
+        )
+
+    # 1. Particiones temporales (solo la primera puede existir ya, si la ingesta anterior la dejó abierta)
+    pidx = partition_index(t)
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(pidx)) + 1, [len(t)]])
+    for n_seg, (a, b) in enumerate(zip(bounds[:-1], bounds[1:])):
+        seg_t, seg_p = t[a:b], p[a:b]
+        existing = None
+        if n_seg == 0:
+            res = await session.execute(
+                select(GaugePartition)
+                .where(GaugePartition.well_id == well_id, GaugePartition.partition == int(pidx[a]))
+            )
+            existing = res.scalar_one_or_none()
+
+        if existing:
+            seg_t = np.concatenate([decode_column(existing.time_data, delta=True), seg_t])
+            seg_p = np.concatenate([decode_column(existing.pressure_data), seg_p])
+            db_part = existing
+        else:
+            db_part = GaugePartition(well_id=well_id, partition=int(pidx[a]), t_start=float(seg_t[0]),
+                                     t_end=0.0, n_points=0, time_data=b"", pressure_data=b"")
+            session.add(db_part)
+        db_part.t_end = float(seg_t[-1])
+        db_part.n_points = len(seg_t)
+        db_part.time_data = encode_column(seg_t, delta=True)
+        db_part.pressure_data = encode_column(seg_p)
+
+    # 2. Decimación logarítmica incremental (sumas por bin)
+    bins, n, sum_t, sum_p = log_bin_sums(t, p)
+    if len(bins):
+        res = await session.execute(
+            select(GaugeLogBin)
+            .where(GaugeLogBin.well_id == well_id, GaugeLogBin.bin.in_([int(b) for b in bins]))
+        )
+        stored = {row.bin: row for row in res.scalars().all()}
+        for b, n_b, st_b, sp_b in zip(bins.tolist(), n.tolist(), sum_t.tolist(), sum_p.tolist()):
+            row = stored.get(b)
+            if row is None:
+                session.add(GaugeLogBin(well_id=well_id, bin=b, n_points=n_b, sum_t=st_b, sum_p=sp_b))
+            else:
+                row.n_points += n_b
+                row.sum_t += st_b
+                row.sum_p += sp_b
+
+    await session.flush()
+    return float(t[-1])
+
+
+async def _load_log_bins(well_id: int, session: AsyncSession):
+    res = await session.execute(
+        select(GaugeLogBin).where(GaugeLogBin.well_id == well_id).order_by(GaugeLogBin.bin)
+    )
+    return res.scalars().all()
+
+
+@router.post("/wells/{well_id}/pressure")
+async def upload_pressure_data(
+        well_id: int,
+        request: Request,
+        time_unit: Literal["days", "seconds"] = Query("days", description="Unidad del tiempo desde el inicio de producción"),
+        smoothing: float = Query(0.1, gt=0, description="Ventana de suavizado de la derivada de Bourdet (ciclos de ln t)"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Ingesta por partes de presión de fondo medida (sensores permanentes).
+    El cuerpo se lee en streaming: text/csv con líneas 'tiempo,presión' o
+    application/octet-stream con pares float64 little-endian (tiempo, presión).
+    Cada carga debe ser posterior a las anteriores; la serie decimada y la derivada
+    se actualizan en la misma operación. Las cargas de un mismo pozo se serializan
+    con un bloqueo de su fila (SELECT ... FOR UPDATE) hasta el commit.
+    """
+    res = await session.execute(select(Well).where(Well.id == well_id).with_for_update())
+    db_well = res.scalar_one_or_none()
+    if not db_well:
+        raise HTTPException(status_code=404, detail="Pozo no encontrado")
+    project = await session.get(Project, db_well.project_id)
+
+    binary = request.headers.get("content-type", "").startswith("application/octet-stream")
+    to_days = 1.0 / 86400.0 if time_unit == "seconds" else 1.0
+
+    res = await session.execute(select(func.max(GaugePartition.t_end)).where(GaugePartition.well_id == well_id))
+    last_t = res.scalar_one_or_none()
+
+    pending, pending_n, total = [], 0, 0
+    buffer = b""
+    # Solo la primera línea del cuerpo puede ser un encabezado
+    header = True
+
+    async def flush():
+        nonlocal pending, pending_n, total, last_t
+        if pending_n:
+            batch = np.concatenate(pending)
+            batch[:, 0] *= to_days
+            last_t = await _store_batch(session, well_id, batch, last_t)
+            total += pending_n
+        pending, pending_n = [], 0
+
+    try:
+        async for block in request.stream():
+            buffer += block
+            if binary:
+                usable = len(buffer) // 16 * 16
+                arr = check_finite(np.frombuffer(buffer[:usable], dtype="<f8").reshape(-1, 2).copy())
+            else:
+                usable = buffer.rfind(b"\n") + 1
+                arr = parse_csv_block(buffer[:usable].decode(), header=header)
+                header = header and usable == 0
+            buffer = buffer[usable:]
+            if len(arr):
+                pending.append(arr)
+                pending_n += len(arr)
+            if pending_n >= FLUSH_POINTS:
+                await flush()
+
+        if buffer.strip():
+            if binary:
+                raise ValueError("El cuerpo binario debe contener pares completos de float64")
+            arr = parse_csv_block(buffer.decode(), header=header)
+            pending.append(arr)
+            pending_n += len(arr)
+        await flush()
+
+        # Derivada de Bourdet suavizada sobre la serie decimada (tamaño acotado por los bins)
+        bins = await _load_log_bins(well_id, session)
+        if bins:
+            t_bin = np.array([b.sum_t / b.n_points for b in bins])
+            dp_bin = project.initial_pressure - np.array([b.sum_p / b.n_points for b in bins])
+            for b, d in zip(bins, bourdet_derivative(t_bin, dp_bin, smoothing)):
+                b.derivative = round(float(d), 4)
+        await session.commit()
+    except ValueError as e:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail=f"Datos inválidos: {str(e)}")
+    except IntegrityError:
+        # Otra ingesta del mismo pozo escribió las mismas particiones o bins
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Ingesta concurrente sobre el mismo pozo; reintente la carga")
+    except HTTPException:
+        await session.rollback()
+        raise
+
+    return {
+        "well_id": well_id,
+        "points_ingested": total,
+        "last_time_days": last_t,
+        "log_bins": len(bins),
+    }
+
+
+@router.get("/wells/{well_id}/pressure")
+async def read_pressure_data(
+        well_id: int,
+        t_start: float = Query(0.0, description="Desde (días)"),
+        t_end: Optional[float] = Query(None, description="Hasta (días)"),
+        max_points: int = Query(5000, gt=0, le=200000, description="Máximo de puntos devueltos (submuestreo uniforme)"),
+        session: AsyncSession = Depends(get_session)
+):
+    """Devuelve la serie cruda en un rango, leyendo solo las particiones que lo cubren."""
+    await _get_well(well_id, session)
+    query = select(GaugePartition).where(GaugePartition.well_id == well_id, GaugePartition.t_end >= t_start)
+    if t_end is not None:
+        query = query.where(GaugePartition.t_start <= t_end)
+    res = await session.execute(query.order_by(GaugePartition.partition))
+    partitions = res.scalars().all()
+
+    def in_range(t):
+        keep = t >= t_start
+        if t_end is not None:
+            keep &= t <= t_end
+        return keep
+
+    # Solo las particiones de los bordes pueden tener puntos fuera del rango: se
+    # decodifican para contarlos; las interiores aportan n_points completos
+    decoded, n_in_range = {}, 0
+    for part in partitions:
+        if part.t_start >= t_start and (t_end is None or part.t_end <= t_end):
+            n_in_range += part.n_points
+        else:
+            t = decode_column(part.time_data, delta=True)
+            decoded[part.id] = (t, in_range(t))
+            n_in_range += int(decoded[part.id][1].sum())
+
+    stride = max(1, int(np.ceil(n_in_range / max_points)))
+    times, pressures, offset = [], [], 0
+    for part in partitions:
+        if part.id in decoded:
+            t, keep = decoded[part.id]
+        else:
+            t = decode_column(part.time_data, delta=True)
+            keep = np.ones(len(t), dtype=bool)
+        p = decode_column(part.pressure_data)
+        # Submuestreo uniforme sobre los puntos del rango (índice global entre particiones)
+        idx = np.flatnonzero(keep)
+        idx = idx[(np.arange(len(idx)) + offset) % stride == 0]
+        offset += int(keep.sum())
+        times.append(t[idx])
+        pressures.append(p[idx])
+
+    return {
+        "well_id": well_id,
+        "stride": stride,
+        "time": np.concatenate(times).tolist() if times else [],
+        "pressure": np.concatenate(pressures).tolist() if pressures else [],
+    }
+
+
+@router.get("/wells/{well_id}/overlay")
+async def overlay_measured_vs_model(
+        well_id: int,
+        superposition: Literal["auto", "direct", "convolution"] = Query(
+            "auto", description="Motor de superposición: directo, por convolución (historias densas) o automático"),
+        grid_days: float = Query(1.0, gt=0, description="Paso de la grilla de convolución (días)"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Superpone la serie medida decimada (Δp y derivada de Bourdet) con el pronóstico
+    del TrilinearSolver evaluado en los mismos tiempos. No lee la serie cruda.
+    El motor de superposición se elige igual que en /simulate/{id}/curve.
+    """
+    db_well = await _get_well(well_id, session)
+    bins = await _load_log_bins(well_id, session)
+    if not bins:
+        raise HTTPException(status_code=404, detail="El pozo no tiene mediciones cargadas")
+
+    project, schedules_map = await load_project_with_schedules(db_well.project_id, session)
+    t_bin = [b.sum_t / b.n_points for b in bins]
+    p_bin = np.array([b.sum_p / b.n_points for b in bins])
+
+    solver = TrilinearSolver(project, project.wells, schedules_map)
+    engine = choose_engine(solver, schedules_map, superposition, grid_days, max(t_bin))
+    try:
+        async with solver_admission.slot():
+            if engine == "convolution":
+                # Los tiempos de los bins no caen sobre la grilla: el motor los resuelve en forma exacta
+                model = await asyncio.to_thread(solver.calculate_curve_convolution, t_bin, grid_days=grid_days)
+            else:
+                model = await asyncio.to_thread(solver.calculate_curve, t_bin)
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la simulación: {str(e)}")
+
+    return {
+        "well": db_well.name,
+        "unit": "psi",
+        "time_unit": "days",
+        "superposition": engine,
+        "time": t_bin,
+        "measured": {
+            "pwf": np.round(p_bin, 2).tolist(),
+            "delta_p": np.round(project.initial_pressure - p_bin, 2).tolist(),
+            "derivative": [b.derivative for b in bins],
+            "n_points": [b.n_points for b in bins],
+        },
+        "model": model["curves"][db_well.name],
+    }
@@ -1,17 +1,112 @@
+from typing import Literal, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlmodel import select
-from app.database import get_session
+from sqlmodel import select, func
+from app.database import async_session, get_session
 from app.models import Project, Well, ProductionSchedule
-from app.solver import TrilinearSolver
+from app.solver import TrilinearSolver, MAX_GRID_POINTS
+from app.schemas import MonteCarloRequest
+from app.montecarlo import check_distributions, effective_workers, snapshot_inputs, run_monte_carlo
+from app.concurrency import AdmissionRejected, solver_admission, curve_flight
 
-import pandas as pd
+import asyncio
+import numpy as np
 import io
 from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/simulate", tags=["Cálculo"])
 
+# A partir de esta cantidad de escalones por pozo, "auto" usa superposición por convolución
+DENSE_HISTORY_STEPS = 50
+
+
+async def load_project_with_schedules(project_id: int, session: AsyncSession):
+    """Carga el proyecto con sus pozos y el cronograma ordenado de cada pozo."""
+    result = await session.execute(
+        select(Project)
+        .where(Project.id == project_id)
+        .options(selectinload(Project.wells))
+    )
+    project = result.scalar_one_or_none()
+
+    if not project or not project.wells:
+        raise HTTPException(status_code=404, detail="Proyecto o pozos no encontrados")
+
+    schedules_map = {}
+    for well in project.wells:
+        sched_res = await session.execute(
+            select(ProductionSchedule)
+            .where(ProductionSchedule.well_id == well.id)
+            .order_by(ProductionSchedule.time_days)
+        )
+        schedules_map[well.id] = sched_res.scalars().all()
+
+    return project, schedules_map
+
+
+async def _project_version(project_id: int, session: AsyncSession):
+    """
+    Huella barata del estado del proyecto para la clave de coalescencia.
+    La API solo agrega pozos y cronogramas, así que el conteo y el id máximo
+    de cada tabla cambian con cualquier modificación.
+    """
+    wells_res = await session.execute(
+        select(func.count(Well.id), func.max(Well.id)).where(Well.project_id == project_id)
+    )
+    sched_res = await session.execute(
+        select(func.count(ProductionSchedule.id), func.max(ProductionSchedule.id))
+        .join(Well, ProductionSchedule.well_id == Well.id)
+        .where(Well.project_id == project_id)
+    )
+    return tuple(wells_res.one()) + tuple(sched_res.one())
+
+
+def too_busy(e: AdmissionRejected):
+    return HTTPException(
+        status_code=429,
+        detail=f"Solver saturado: {e.queue_depth} simulaciones en espera. Reintente más tarde.",
+        headers={"Retry-After": str(e.retry_after), "X-Queue-Depth": str(e.queue_depth)}
+    )
+
+
+def _is_dense_on_grid(solver: TrilinearSolver, schedules_map, grid_days: float):
+    """Criterio de "auto": historia densa y escalones alineados con la grilla de convolución."""
+    dense = max(len(s) for s in schedules_map.values()) > DENSE_HISTORY_STEPS
+    return dense and solver.schedules_on_grid(grid_days)
+
+
+def choose_engine(solver: TrilinearSolver, schedules_map, superposition: str, grid_days: float,
+                   horizon_days: float, production: bool = False):
+    """
+    Resuelve el motor de superposición efectivo. La convolución solo admite pozos a tasa
+    impuesta: con producción y pozos a pwf impuesta, "convolution" explícito es un 400
+    y "auto" usa el camino directo. "auto" tampoco elige la convolución si la grilla
+    hasta horizon_days superaría MAX_GRID_POINTS (con "convolution" explícito el
+    solver lo rechaza con ValueError).
+    """
+    if superposition == "convolution":
+        if production and solver.has_pressure_control():
+            raise HTTPException(
+                status_code=400,
+                detail="superposition=convolution no admite pozos con pwf impuesta; use direct o auto"
+            )
+        return "convolution"
+    if (superposition == "auto" and horizon_days / grid_days <= MAX_GRID_POINTS
+            and _is_dense_on_grid(solver, schedules_map, grid_days)):
+        if not (production and solver.has_pressure_control()):
+            return "convolution"
+    return "direct"
+
+
+def _build_time_steps(total_days: int, step_days: int, log_scale: bool):
+    if log_scale:
+        # Generamos 50 puntos desde 1e-5 hasta total_days para capturar el almacenamiento (Wellbore Storage)
+        # Usamos base 10 para el espaciamiento logarítmico
+        return np.logspace(-5, np.log10(total_days), 50).tolist()
+    # Escala lineal estándar para monitoreo diario
+    return list(range(1, total_days + 1, step_days))
+
 # @router.post("/{project_id}")
 # async def run_simulation(project_id: int, session: AsyncSession = Depends(get_session)):
 #     """
@@ -62,57 +157,133 @@ async def run_curve_simulation(
         total_days: int = Query(365, description="Días totales a simular"),
         step_days: int = Query(5, description="Intervalo entre puntos (solo si log_scale=False)"),
         log_scale: bool = Query(False, description="Si es True, usa pasos logarítmicos para verificación Log-Log"),
+        superposition: Literal["auto", "direct", "convolution"] = Query(
+            "auto", description="Motor de superposición: directo, por convolución (historias densas) o automático"),
+        rate_tolerance: float = Query(0.0, ge=0, description="Fusiona cambios de tasa menores a este valor (STB/D), solo convolución"),
+        grid_days: float = Query(1.0, gt=0, description="Paso de la grilla de convolución (días)"),
+        include_production: bool = Query(False, description="Si es True, agrega tasa, acumulada y EUR por pozo"),
+        abandonment_rate: Optional[float] = Query(None, gt=0, description="Tasa de abandono para EUR (STB/D, pozos a pwf impuesta)"),
+        abandonment_pressure: Optional[float] = Query(None, gt=0, description="Presión de abandono para EUR (psi, pozos a tasa impuesta)"),
+        eur_horizon_days: float = Query(10950.0, gt=0, description="Horizonte máximo para buscar el EUR (días)"),
         session: AsyncSession = Depends(get_session)
 ):
     """
     Genera una curva de presión, delta P y derivada vs tiempo.
     Soporta escala logarítmica para validación contra el paper SPE-215031-PA.
+    Con include_production, la misma pasada de Laplace devuelve tasa, producción
+    acumulada (inversión de q̄/s) y EUR por pozo (si se indica un límite de abandono).
+    "superposition" en la respuesta informa el motor efectivamente usado.
+    Peticiones idénticas simultáneas (mismo proyecto, versión y parámetros)
+    comparten una única corrida del solver.
     """
-    # 1. Obtener proyecto y cargar sus pozos asociados
-    result = await session.execute(
-        select(Project)
-        .where(Project.id == project_id)
-        .options(selectinload(Project.wells))
-    )
-    project = result.scalar_one_or_none()
+    version = await _project_version(project_id, session)
+    # Liberamos la conexión: esta petición puede quedar esperando una corrida ajena
+    await session.close()
+    flight_key = (project_id, version, total_days, step_days, log_scale, superposition, rate_tolerance, grid_days,
+                  include_production, abandonment_rate, abandonment_pressure, eur_horizon_days)
 
-    if not project or not project.wells:
-        raise HTTPException(status_code=404, detail="Proyecto o pozos no encontrados")
+    async def compute():
+        async with solver_admission.slot():
+            # Sesión propia: la corrida compartida no depende de la petición que la originó
+            async with async_session() as own_session:
+                # 1-2. Obtener proyecto, pozos y cronogramas (ProductionSchedules)
+                project, schedules_map = await load_project_with_schedules(project_id, own_session)
 
-    # 2. Cargar los cronogramas (ProductionSchedules) para cada pozo
-    schedules_map = {}
-    for well in project.wells:
-        sched_res = await session.execute(
-            select(ProductionSchedule)
-            .where(ProductionSchedule.well_id == well.id)
-            .order_by(ProductionSchedule.time_days)
-        )
-        schedules_map[well.id] = sched_res.scalars().all()
+            # 3. Configurar pasos de tiempo para la curva
+            time_steps = _build_time_steps(total_days, step_days, log_scale)
 
-    # 3. Configurar pasos de tiempo para la curva
-    if log_scale:
-        # Generamos 50 puntos desde 1e-5 hasta total_days para capturar el almacenamiento (Wellbore Storage)
-        import numpy as np
-        # Usamos base 10 para el espaciamiento logarítmico
-        time_steps = np.logspace(-5, np.log10(total_days), 50).tolist()
-    else:
-        # Escala lineal estándar para monitoreo diario
-        time_steps = list(range(1, total_days + 1, step_days))
+            # 4. Ejecutar el Solver con la historia de producción real
+            solver = TrilinearSolver(project, project.wells, schedules_map)
+            # Con EUR la grilla de convolución se extiende hasta eur_horizon_days
+            with_eur = include_production and (abandonment_rate is not None or abandonment_pressure is not None)
+            horizon = max(max(time_steps), eur_horizon_days if with_eur else 0.0)
+            engine = choose_engine(solver, schedules_map, superposition, grid_days, horizon, include_production)
+            try:
+                # El solver devuelve pwf, delta_p y derivative
+                if include_production:
+                    curve_results = await asyncio.to_thread(
+                        solver.calculate_production, time_steps,
+                        abandonment_rate=abandonment_rate, abandonment_pressure=abandonment_pressure,
+                        eur_horizon_days=eur_horizon_days, superposition=engine,
+                        grid_days=grid_days, rate_tolerance=rate_tolerance
+                    )
+                elif engine == "convolution":
+                    curve_results = await asyncio.to_thread(
+                        solver.calculate_curve_convolution, time_steps,
+                        grid_days=grid_days, rate_tolerance=rate_tolerance
+                    )
+                else:
+                    curve_results = await asyncio.to_thread(solver.calculate_curve, time_steps)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error en la simulación: {str(e)}")
+
+        return {
+            "project": project.name,
+            "unit": "psi",
+            "time_unit": "days",
+            "is_log_scale": log_scale,
+            "superposition": engine,
+            "data": curve_results
+        }
 
-    # 4. Ejecutar el Solver con la historia de producción real
-    solver = TrilinearSolver(project, project.wells, schedules_map)
     try:
-        # El solver devuelve pwf, delta_p y derivative
-        curve_results = solver.calculate_curve(time_steps)
+        return await curve_flight.do(flight_key, compute)
+    except AdmissionRejected as e:
+        raise too_busy(e)
+
+
+@router.post("/{project_id}/montecarlo")
+async def run_montecarlo_simulation(
+        project_id: int,
+        body: MonteCarloRequest,
+        total_days: int = Query(365, description="Días totales a simular"),
+        step_days: int = Query(5, description="Intervalo entre puntos (solo si log_scale=False)"),
+        log_scale: bool = Query(False, description="Si es True, usa pasos logarítmicos"),
+        session: AsyncSession = Depends(get_session)
+):
+    """
+    Pronóstico probabilístico (P10/P50/P90) de pwf y delta P.
+    Muestrea las propiedades inciertas, evalúa las muestras en lotes vectorizados
+    en paralelo y reduce a curvas de cuantiles con histogramas que cada proceso arma
+    para sus lotes y el principal solo suma.
+    """
+    distributions = {name: d.model_dump() for name, d in body.distributions.items()}
+    errors = check_distributions(distributions)
+    if errors:
+        raise HTTPException(status_code=400, detail="; ".join(errors))
+
+    project, schedules_map = await load_project_with_schedules(project_id, session)
+    time_steps = _build_time_steps(total_days, step_days, log_scale)
+
+    inputs = snapshot_inputs(project, project.wells, schedules_map)
+    project_name = project.name
+    # Liberamos la conexión: la corrida no usa la base y puede llevar varios segundos
+    await session.close()
+    n_workers = effective_workers(body.n_workers)
+    try:
+        # La corrida reserva en la admisión tantos cupos como núcleos ocupa
+        async with solver_admission.slot(weight=n_workers):
+            # Se ejecuta fuera del event loop: la corrida puede llevar varios segundos
+            mc_results = await asyncio.to_thread(
+                run_monte_carlo, inputs, time_steps, distributions,
+                n_samples=body.n_samples, batch_size=body.batch_size,
+                seed=body.seed, n_workers=n_workers
+            )
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Parámetros de muestreo inválidos: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error en la simulación: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error en la simulación Monte Carlo: {str(e)}")
 
     return {
-        "project": project.name,
+        "project": project_name,
         "unit": "psi",
         "time_unit": "days",
         "is_log_scale": log_scale,
-        "data": curve_results
+        "data": mc_results
     }
 
 # @router.post("/{project_id}/rate-curve")
@@ -136,57 +307,85 @@ async def export_simulation_to_excel(
     project_id: int, 
     total_days: int = Query(1800, description="Días totales de la simulación (ej. 1800 para 5 años)"),
     step_days: int = Query(10, description="Frecuencia de pasos en días"),
+    abandonment_rate: Optional[float] = Query(None, gt=0, description="Tasa de abandono para EUR (STB/D, pozos a pwf impuesta)"),
+    abandonment_pressure: Optional[float] = Query(None, gt=0, description="Presión de abandono para EUR (psi, pozos a tasa impuesta)"),
+    eur_horizon_days: float = Query(10950.0, gt=0, description="Horizonte máximo para buscar el EUR (días)"),
+    superposition: Literal["auto", "direct", "convolution"] = Query(
+        "auto", description="Motor de superposición: directo, por convolución (historias densas) o automático"),
+    rate_tolerance: float = Query(0.0, ge=0, description="Fusiona cambios de tasa menores a este valor (STB/D), solo convolución"),
+    grid_days: float = Query(1.0, gt=0, description="Paso de la grilla de convolución (días)"),
     session: AsyncSession = Depends(get_session)
 ):
     """
     Genera un Excel con tiempos extendidos y parámetros definibles por el usuario.
+    Incluye presiones, tasas, producción acumulada y EUR (si se indica un límite de
+    abandono) de una misma pasada del solver.
     """
-    # 1. Obtener proyecto y pozos
-    result = await session.execute(
-        select(Project)
-        .where(Project.id == project_id)
-        .options(selectinload(Project.wells))
-    )
-    project = result.scalar_one_or_none()
-    
-    if not project:
-        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    # Import diferido: pandas/openpyxl solo se necesitan para exportar
+    import pandas as pd
 
-    # 2. Cargar cronogramas para superposición
-    schedules_map = {}
-    for well in project.wells:
-        sched_res = await session.execute(
-            select(ProductionSchedule).where(ProductionSchedule.well_id == well.id)
-        )
-        schedules_map[well.id] = sched_res.scalars().all()
+    # 1-2. Obtener proyecto, pozos y cronogramas para superposición
+    project, schedules_map = await load_project_with_schedules(project_id, session)
 
     # 3. Configurar el rango de tiempo solicitado
     time_steps = list(range(1, total_days + 1, step_days))
     
-    # 4. Ejecutar el Solver
+    # 4. Ejecutar el Solver (presión, tasa y acumulada en la misma pasada)
     solver = TrilinearSolver(project, project.wells, schedules_map)
-    pressure_data = solver.calculate_curve(time_steps)
-    rate_data = solver.calculate_rate_curve(time_steps)
+    with_eur = abandonment_rate is not None or abandonment_pressure is not None
+    horizon = max(max(time_steps), eur_horizon_days if with_eur else 0.0)
+    engine = choose_engine(solver, schedules_map, superposition, grid_days, horizon, production=True)
+    try:
+        async with solver_admission.slot():
+            production = await asyncio.to_thread(
+                solver.calculate_production, time_steps,
+                abandonment_rate=abandonment_rate, abandonment_pressure=abandonment_pressure,
+                eur_horizon_days=eur_horizon_days, superposition=engine,
+                grid_days=grid_days, rate_tolerance=rate_tolerance
+            )
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en la simulación: {str(e)}")
 
-    # 5. Crear DataFrames
-    df_pressures = pd.DataFrame(pressure_data["curves"])
-    df_pressures.insert(0, "Tiempo (Días)", pressure_data["time"])
+    # 5. Crear DataFrames (una columna por pozo)
+    def curve_frame(key):
+        df = pd.DataFrame({name: curve[key] for name, curve in production["curves"].items()})
+        df.insert(0, "Tiempo (Días)", production["time"])
+        return df
 
-    df_rates = pd.DataFrame(rate_data["curves"])
-    df_rates.insert(0, "Tiempo (Días)", rate_data["time"])
+    df_eur = None if production["eur"] is None else pd.DataFrame([
+        {
+            "Pozo": name,
+            "Control": production["curves"][name]["control"],
+            "EUR (STB)": item["eur_stb"],
+            "Criterio": item["criterion"],
+            "Tiempo de abandono (Días)": item["abandonment_time_days"],
+            "Alcanzado": item["reached"],
+        }
+        for name, item in production["eur"].items()
+    ])
 
     # 6. Preparar el archivo Excel en memoria
     output = io.BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_pressures.to_excel(writer, sheet_name="Presiones_psi", index=False)
-        df_rates.to_excel(writer, sheet_name="Tasas_STBD", index=False)
+        curve_frame("pwf").to_excel(writer, sheet_name="Presiones_psi", index=False)
+        curve_frame("rate").to_excel(writer, sheet_name="Tasas_STBD", index=False)
+        curve_frame("cumulative").to_excel(writer, sheet_name="Acumulada_STB", index=False)
+        if df_eur is not None:
+            df_eur.to_excel(writer, sheet_name="EUR", index=False)
         
         # Pestaña de configuración para registro
         config_df = pd.DataFrame([{
             "Proyecto": project.name,
             "Días Simulados": total_days,
             "Intervalo": step_days,
-            "P_inicial (psi)": project.initial_pressure
+            "Superposición": engine,
+            "P_inicial (psi)": project.initial_pressure,
+            "Tasa de abandono (STB/D)": abandonment_rate,
+            "Presión de abandono (psi)": abandonment_pressure
         }])
         config_df.to_excel(writer, sheet_name="Configuracion", index=False)
 
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Dict, Literal
 
 class ProductionScheduleCreate(BaseModel):
     time_days: float = Field(..., description="Tiempo desde el inicio (días)")
@@ -42,4 +42,40 @@ class ProjectCreate(BaseModel):
     sigma_o: float
     k_fo: float
     phi_fo: float
-    ct_fo: float
\ No newline at end of file
+    ct_fo: float
+
+class ParameterDistribution(BaseModel):
+    dist: Literal["normal", "lognormal", "uniform", "triangular"]
+    mean: Optional[float] = Field(None, description="Media (normal, lognormal)")
+    std: Optional[float] = Field(None, gt=0, description="Desvío estándar (normal, lognormal)")
+    low: Optional[float] = Field(None, description="Mínimo (uniform, triangular) o truncamiento inferior (normal, lognormal)")
+    high: Optional[float] = Field(None, description="Máximo (uniform, triangular) o truncamiento superior (normal, lognormal)")
+    mode: Optional[float] = Field(None, description="Moda (triangular)")
+
+    @model_validator(mode="after")
+    def check_params(self):
+        required = {
+            "normal": ("mean", "std"),
+            "lognormal": ("mean", "std"),
+            "uniform": ("low", "high"),
+            "triangular": ("low", "mode", "high"),
+        }[self.dist]
+        missing = [name for name in required if getattr(self, name) is None]
+        if missing:
+            raise ValueError(f"La distribución '{self.dist}' requiere: {', '.join(missing)}")
+        if self.dist == "lognormal" and self.mean <= 0:
+            raise ValueError("La distribución 'lognormal' requiere mean > 0")
+        if self.low is not None and self.high is not None and self.low >= self.high:
+            raise ValueError("Se requiere low < high")
+        if self.dist == "triangular" and not (self.low <= self.mode <= self.high):
+            raise ValueError("La distribución 'triangular' requiere low <= mode <= high")
+        return self
+
+class MonteCarloRequest(BaseModel):
+    distributions: Dict[str, ParameterDistribution] = Field(
+        ..., description="Propiedades inciertas: k_fi, xf, kf, sigma_i, spacing (todos los pozos) o initial_pressure"
+    )
+    n_samples: int = Field(1000, gt=0, le=100000, description="Cantidad de muestras")
+    batch_size: int = Field(100, gt=0, le=5000, description="Muestras evaluadas por lote vectorizado")
+    seed: Optional[int] = Field(None, ge=0, description="Semilla para resultados reproducibles")
+    n_workers: Optional[int] = Field(None, gt=0, description="Procesos en paralelo (por defecto y como máximo, los núcleos disponibles)")
@@ -1,6 +1,58 @@
 import numpy as np
 import math
+from functools import lru_cache
 from scipy.linalg import solve
+from scipy.signal import fftconvolve
+
+
+# Tolerancia (fracción de grid_days) para considerar un tiempo alineado con la grilla
+GRID_TOLERANCE = 1e-6
+# Tamaño máximo de la grilla de convolución (acota la memoria del motor FFT)
+MAX_GRID_POINTS = 2_000_000
+# Pasada de Laplace de calculate_production: tiempos transcurridos resueltos en forma exacta
+# antes de pasar a una tabla logarítmica, densidad de esa tabla y tamaño de cada lote
+MAX_EXACT_DT = 2048
+LOG_POINTS_PER_DECADE = 200
+LAPLACE_CHUNK = 256
+# Pares (tiempo, escalón) evaluados por lote en la superposición de calculate_production
+SUPERPOSITION_PAIRS = 1_000_000
+
+
+def _on_grid(times, grid_days):
+    times = np.asarray(times, dtype=float)
+    return np.abs(times / grid_days - np.rint(times / grid_days)) <= GRID_TOLERANCE
+
+
+@lru_cache(maxsize=None)
+def _stehfest_coeffs(n):
+    """Calcula los coeficientes V_k de Stehfest (se cachean: solo dependen de n)."""
+    v = np.zeros(n)
+    n2 = n // 2
+    for k in range(1, n + 1):
+        temp_v = 0.0
+        for j in range((k + 1) // 2, min(k, n2) + 1):
+            num = (j ** n2) * math.factorial(2 * j)
+            den = (math.factorial(n2 - j) * math.factorial(j) * math.factorial(j - 1) * math.factorial(
+                k - j) * math.factorial(2 * j - k))
+            temp_v += num / den
+        v[k - 1] = ((-1) ** (n2 + k)) * temp_v
+    v.setflags(write=False)
+    return v
+
+
+def compress_rate_history(q_steps, tolerance):
+    """
+    Fusiona cambios de tasa despreciables: se descarta todo escalón cuya tasa difiere
+    menos de `tolerance` (STB/D) de la última tasa conservada.
+    q_steps: lista ordenada de (time_days, rate_stbd).
+    """
+    if tolerance <= 0 or not q_steps:
+        return list(q_steps)
+    kept = [q_steps[0]]
+    for t_start, q_val in q_steps[1:]:
+        if abs(q_val - kept[-1][1]) >= tolerance:
+            kept.append((t_start, q_val))
+    return kept
 
 
 class TrilinearSolver:
@@ -13,18 +65,24 @@ class TrilinearSolver:
         self.L_ref = wells[0].xf if wells else 100.0
 
     def _get_stehfest_coeffs(self, n):
-        """Calcula los coeficientes V_k de Stehfest."""
-        v = np.zeros(n)
-        n2 = n // 2
-        for k in range(1, n + 1):
-            temp_v = 0.0
-            for j in range((k + 1) // 2, min(k, n2) + 1):
-                num = (j ** n2) * math.factorial(2 * j)
-                den = (math.factorial(n2 - j) * math.factorial(j) * math.factorial(j - 1) * math.factorial(
-                    k - j) * math.factorial(2 * j - k))
-                temp_v += num / den
-            v[k - 1] = ((-1) ** (n2 + k)) * temp_v
-        return v
+        """Coeficientes V_k de Stehfest (solo lectura, compartidos entre corridas)."""
+        return _stehfest_coeffs(n)
+
+    def _unit_response(self, s, omega, lambd, cfd):
+        """
+        Núcleo trilineal vectorizado: devuelve (PwD propio, alpha_i) para arrays de s
+        y parámetros con forma compatible (broadcasting de NumPy).
+        """
+        u_i = s * self.f_ki(s, omega, lambd)
+        alpha_i = np.sqrt(u_i)
+
+        # --- FÓRMULA TRILINEAL (EJEMPLO 1) ---
+        # psi vincula la fractura con el reservorio
+        psi = np.sqrt((2.0 / cfd) * alpha_i * np.tanh(np.maximum(1e-8, alpha_i)))
+
+        # La solución debe ser PwD = pi / (s * Cfd * psi * tanh(psi))
+        pwd_self = np.pi / (s * cfd * psi * np.tanh(np.maximum(1e-8, psi)))
+        return pwd_self, alpha_i
 
     def solve_laplace_unit_rate(self, s, source_idx):
         A = np.eye(self.n, dtype=complex)
@@ -36,17 +94,9 @@ class TrilinearSolver:
         omega = (w_prod.phi_fi * w_prod.ct_fi) / max(1e-10,
                                                      (w_prod.phi_fi * w_prod.ct_fi + w_prod.phi_mi * w_prod.ct_mi))
         lambd = (w_prod.sigma_i * w_prod.k_mi * (self.L_ref ** 2)) / max(1e-10, w_prod.k_fi)
-
-        u_i = s * self.f_ki(s, omega, lambd)
-        alpha_i = np.sqrt(u_i)
         cfd = (w_prod.kf * w_prod.wf) / max(1e-10, (w_prod.k_fi * w_prod.xf))
 
-        # --- FÓRMULA TRILINEAL (EJEMPLO 1) ---
-        # psi vincula la fractura con el reservorio
-        psi = np.sqrt((2.0 / cfd) * alpha_i * np.tanh(max(1e-8, alpha_i)))
-
-        # La solución debe ser PwD = pi / (s * Cfd * psi * tanh(psi))
-        pwd_self = np.pi / (s * cfd * psi * np.tanh(max(1e-8, psi)))
+        pwd_self, alpha_i = self._unit_response(s, omega, lambd, cfd)
         b[source_idx] = pwd_self
 
         for j in range(self.n):
@@ -58,9 +108,17 @@ class TrilinearSolver:
 
     def f_ki(self, s, omega, lambd):
         """Función de transferencia de doble porosidad (Warren & Root)."""
-        if lambd == 0 or (1 - omega) == 0: return 1.0
-        arg = np.sqrt(max(1e-12, (3.0 * (1.0 - omega) * s) / lambd))
-        return omega + np.sqrt((lambd * (1.0 - omega)) / (3.0 * s)) * np.tanh(arg)
+        if np.ndim(s) == 0 and np.ndim(omega) == 0 and np.ndim(lambd) == 0:
+            if lambd == 0 or (1 - omega) == 0: return 1.0
+            arg = np.sqrt(max(1e-12, (3.0 * (1.0 - omega) * s) / lambd))
+            return omega + np.sqrt((lambd * (1.0 - omega)) / (3.0 * s)) * np.tanh(arg)
+
+        # Versión vectorizada (lotes de muestras y/o puntos de Stehfest)
+        active = (lambd != 0) & ((1.0 - omega) != 0)
+        lambd_safe = np.where(active, lambd, 1.0)
+        arg = np.sqrt(np.maximum(1e-12, (3.0 * (1.0 - omega) * s) / lambd_safe))
+        f_val = omega + np.sqrt((lambd_safe * (1.0 - omega)) / (3.0 * s)) * np.tanh(arg)
+        return np.where(active, f_val, 1.0)
 
     def calculate_curve(self, days_list, n_stehfest=12):
         """Ejecuta la simulación y aplica Stehfest para volver al dominio del tiempo."""
@@ -111,6 +169,9 @@ class TrilinearSolver:
                 p_val = round(max(0, self.p.initial_pressure - dp_total[i]), 2)
                 temp_pwf[well.name].append(p_val)
 
+        return self._build_results(days_list, temp_pwf, results)
+
+    def _build_results(self, days_list, temp_pwf, results):
         # Cálculo de la Derivada de Bourdet para el gráfico Log-Log
         t_arr = np.array(days_list)
         for name in temp_pwf:
@@ -127,3 +188,461 @@ class TrilinearSolver:
             results[name]["derivative"] = [round(d, 2) for d in deriv.tolist()]
 
         return {"time": days_list, "curves": results}
+
+    def _unit_response_table(self, i_prod, dt_days, v):
+        """
+        Respuesta a tasa unitaria (psi por STB/D del pozo productor) en todos los
+        pozos para un vector de tiempos transcurridos dt_days.
+        Evalúa todos los puntos de Stehfest de todos los tiempos en una sola llamada.
+        Devuelve un array (n_pozos, len(dt_days)).
+        """
+        well_prod = self.wells[i_prod]
+        dt_days = np.asarray(dt_days, dtype=float)
+        table = np.zeros((self.n, len(dt_days)))
+        positive = dt_days > 0
+        if not np.any(positive):
+            return table
+
+        k_ref = self.wells[0].k_fi
+        scale = (141.2 * self.p.mu * self.p.b_factor) / (k_ref * self.p.h)
+        phi_ref = well_prod.phi_fi
+        ct_ref = well_prod.ct_fi
+        c_well_val = getattr(well_prod, 'c_wellbore', 0.0)
+        c_d = (0.8936 * c_well_val) / (phi_ref * ct_ref * self.p.h * (self.L_ref ** 2))
+
+        omega = (well_prod.phi_fi * well_prod.ct_fi) / max(1e-10, (well_prod.phi_fi * well_prod.ct_fi +
+                                                                   well_prod.phi_mi * well_prod.ct_mi))
+        lambd = (well_prod.sigma_i * well_prod.k_mi * (self.L_ref ** 2)) / max(1e-10, well_prod.k_fi)
+        cfd = (well_prod.kf * well_prod.wf) / max(1e-10, (well_prod.k_fi * well_prod.xf))
+
+        t_d_local = (0.00633 * k_ref * dt_days[positive]) / (phi_ref * self.p.mu * ct_ref * (self.L_ref ** 2))
+        ln2_td = np.log(2.0) / t_d_local
+        s_lap = np.arange(1, len(v) + 1)[None, :] * ln2_td[:, None]
+        pwd_self, alpha_i = self._unit_response(s_lap, omega, lambd, cfd)
+
+        factor = (scale / well_prod.n_f) * ln2_td
+        for j in range(self.n):
+            if j == i_prod:
+                resp = pwd_self
+                if c_d > 0:
+                    resp = resp / (1.0 + c_d * (s_lap ** 2) * resp)
+            else:
+                dist_d = abs(self.wells[j].spacing * (j - i_prod)) / self.L_ref
+                resp = pwd_self * np.exp(-alpha_i * dist_d)
+            table[j, positive] = factor * (resp @ v)
+        return table
+
+    def schedules_on_grid(self, grid_days):
+        """True si todos los escalones de todos los pozos caen sobre la grilla de convolución."""
+        times = np.array([s.time_days for sched in self.schedules.values() for s in sched], dtype=float)
+        return bool(np.all(_on_grid(times, grid_days)))
+
+    def calculate_curve_convolution(self, days_list, n_stehfest=12, grid_days=1.0, rate_tolerance=0.0):
+        """
+        Superposición por convolución para historias de tasa densas (p. ej. asignación diaria).
+
+        La historia de cada pozo se discretiza como señal de cambios de tasa sobre una
+        grilla uniforme de paso grid_days y se convoluciona (FFT) con la respuesta unitaria
+        tabulada en la misma grilla: O(G log G) en lugar de O(tiempos x escalones) inversiones.
+        Los tiempos de salida y los escalones fuera de la grilla se superponen en forma
+        directa (vectorizada), de modo que el resultado no depende de redondeos.
+
+        rate_tolerance (STB/D): si es > 0, se fusionan cambios de tasa menores que ese valor
+        antes de resolver (ver compress_rate_history).
+        Devuelve la misma estructura que calculate_curve.
+        """
+        dp_total = self._convolution_delta_p(np.asarray(days_list, dtype=float), n_stehfest,
+                                             grid_days, rate_tolerance)
+        results = {w.name: {"pwf": [], "delta_p": [], "derivative": []} for w in self.wells}
+        temp_pwf = {}
+        for i, well in enumerate(self.wells):
+            temp_pwf[well.name] = np.round(np.maximum(0, self.p.initial_pressure - dp_total[i]), 2).tolist()
+        return self._build_results(days_list, temp_pwf, results)
+
+    def _convolution_delta_p(self, t_out, n_stehfest, grid_days, rate_tolerance):
+        """Δp (n_pozos, n_tiempos) por superposición con convolución FFT sobre la grilla."""
+
+        v = self._get_stehfest_coeffs(n_stehfest)
+        n_grid = int(np.ceil(t_out.max() / grid_days)) if len(t_out) else 0
+        if n_grid > MAX_GRID_POINTS:
+            raise ValueError(f"La grilla de convolución tendría {n_grid} puntos (máximo {MAX_GRID_POINTS}); "
+                             f"aumente grid_days")
+        grid_idx = np.rint(t_out / grid_days)
+        on_grid = _on_grid(t_out, grid_days)
+        grid_dt = np.arange(n_grid + 1) * grid_days
+
+        dp_total = np.zeros((self.n, len(t_out)))
+        for i_prod, well_prod in enumerate(self.wells):
+            well_sched = self.schedules.get(well_prod.id, [])
+            q_steps = compress_rate_history([(s.time_days, s.rate_stbd or 0.0) for s in well_sched],
+                                            rate_tolerance)
+            if not q_steps:
+                continue
+            t_steps = np.array([t for t, _ in q_steps])
+            dq = np.diff(np.array([0.0] + [q for _, q in q_steps]))
+
+            if np.any(on_grid):
+                # Señal de cambios de tasa sobre la grilla (t=0 .. n_grid), solo escalones alineados
+                step_on_grid = _on_grid(t_steps, grid_days)
+                signal = np.zeros(n_grid + 1)
+                idx = np.rint(t_steps / grid_days).astype(int)
+                inside = step_on_grid & (idx >= 0) & (idx <= n_grid)
+                np.add.at(signal, idx[inside], dq[inside])
+
+                table = self._unit_response_table(i_prod, grid_dt, v)
+                cols = grid_idx[on_grid].astype(int)
+                for j in range(self.n):
+                    conv = fftconvolve(signal, table[j])[:n_grid + 1]
+                    dp_total[j, on_grid] += conv[cols]
+
+                # Escalones fuera de la grilla: superposición directa en los tiempos de la grilla
+                t_grid_out = t_out[on_grid]
+                for k in np.flatnonzero(~step_on_grid):
+                    dp_total[:, on_grid] += dq[k] * self._unit_response_table(i_prod, t_grid_out - t_steps[k], v)
+
+            for i_t in np.flatnonzero(~on_grid):
+                dt = t_out[i_t] - t_steps
+                active = dt > 0
+                if not np.any(active):
+                    continue
+                table = self._unit_response_table(i_prod, dt[active], v)
+                dp_total[:, i_t] += table @ dq[active]
+
+        return dp_total
+
+    def calculate_pwf_samples(self, days_list, samples, n_stehfest=12):
+        """
+        Versión vectorizada de calculate_curve para un lote de muestras Monte Carlo.
+
+        samples: dict propiedad -> array (B,). Las propiedades de pozo (k_fi, xf, kf,
+        sigma_i, spacing) reemplazan el valor de todos los pozos; initial_pressure
+        reemplaza el del proyecto. Las propiedades ausentes toman el valor de la DB.
+
+        Devuelve (pwf, p_init): pwf con forma (B, n_pozos, n_tiempos) y p_init (B,).
+        """
+        v = self._get_stehfest_coeffs(n_stehfest)
+        steps = np.arange(1, n_stehfest + 1)
+        batch = len(next(iter(samples.values()))) if samples else 1
+
+        def param(obj, name):
+            value = samples.get(name, getattr(obj, name))
+            return np.broadcast_to(np.asarray(value, dtype=float), (batch,))
+
+        k_fi = [param(w, "k_fi") for w in self.wells]
+        xf = [param(w, "xf") for w in self.wells]
+        kf = [param(w, "kf") for w in self.wells]
+        sigma_i = [param(w, "sigma_i") for w in self.wells]
+        spacing = [param(w, "spacing") for w in self.wells]
+        p_init = param(self.p, "initial_pressure")
+
+        # Longitud y permeabilidad de referencia por muestra (igual que en calculate_curve)
+        L_ref = xf[0] if self.wells else np.full(batch, 100.0)
+        k_ref = k_fi[0]
+        scale = (141.2 * self.p.mu * self.p.b_factor) / (k_ref * self.p.h)
+
+        # Parámetros adimensionales por pozo productor, forma (B, 1) para broadcast con Stehfest
+        prod = []
+        for i, w in enumerate(self.wells):
+            omega = (w.phi_fi * w.ct_fi) / max(1e-10, (w.phi_fi * w.ct_fi + w.phi_mi * w.ct_mi))
+            lambd = (sigma_i[i] * w.k_mi * (L_ref ** 2)) / np.maximum(1e-10, k_fi[i])
+            cfd = (kf[i] * w.wf) / np.maximum(1e-10, k_fi[i] * xf[i])
+            c_well_val = getattr(w, 'c_wellbore', 0.0) or 0.0
+            c_d = (0.8936 * c_well_val) / (w.phi_fi * w.ct_fi * self.p.h * (L_ref ** 2))
+            dist_d = [np.abs(spacing[j] * (j - i)) / L_ref for j in range(self.n)]
+            sched = self.schedules.get(w.id, [])
+            q_steps = [(s.time_days, s.rate_stbd or 0.0) for s in sched]
+            prod.append((omega, lambd[:, None], cfd[:, None], c_d[:, None], dist_d, q_steps))
+
+        pwf = np.empty((batch, self.n, len(days_list)))
+        for i_t, t_day in enumerate(days_list):
+            dp_total = np.zeros((batch, self.n))
+            for i_prod, well_prod in enumerate(self.wells):
+                omega, lambd, cfd, c_d, dist_d, q_steps = prod[i_prod]
+                phi_ref = well_prod.phi_fi
+                ct_ref = well_prod.ct_fi
+
+                for k in range(len(q_steps)):
+                    t_start, q_val = q_steps[k]
+                    if t_day <= t_start:
+                        continue
+                    q_per_fracture = (q_val - (q_steps[k - 1][1] if k > 0 else 0.0)) / well_prod.n_f
+                    dt = t_day - t_start
+                    t_d_local = (0.00633 * k_ref * dt) / (phi_ref * self.p.mu * ct_ref * (L_ref ** 2))
+                    ln2_td = np.log(2.0) / t_d_local
+
+                    # Todos los puntos de Stehfest de todas las muestras en una sola evaluación
+                    s_lap = steps[None, :] * ln2_td[:, None]
+                    pwd_self, alpha_i = self._unit_response(s_lap, omega, lambd, cfd)
+
+                    pwd_well = np.where(c_d > 0, pwd_self / (1.0 + c_d * (s_lap ** 2) * pwd_self), pwd_self)
+                    factor = q_per_fracture * scale * ln2_td
+                    for j in range(self.n):
+                        if j == i_prod:
+                            resp = pwd_well
+                        else:
+                            resp = pwd_self * np.exp(-alpha_i * dist_d[j][:, None])
+                        dp_total[:, j] += factor * (resp @ v)
+
+            pwf[:, :, i_t] = np.maximum(0.0, p_init[:, None] - dp_total)
+
+        return pwf, np.array(p_init)
+
+    def _laplace_response_matrix(self, s_dim):
+        """
+        Matriz de respuestas a escalón de tasa unitaria en el espacio de Laplace, con s
+        dimensional (1/día): R[k, j, i] = presión en el pozo j (psi·día por STB/D)
+        por un escalón unitario en el pozo i, evaluada en s_dim[k].
+        """
+        s_dim = np.asarray(s_dim, dtype=float)
+        R = np.zeros((len(s_dim), self.n, self.n))
+        k_ref = self.wells[0].k_fi
+        scale = (141.2 * self.p.mu * self.p.b_factor) / (k_ref * self.p.h)
+
+        for i, w in enumerate(self.wells):
+            # t_D = a_i * t  =>  L{f(a_i t)}(s) = F_D(s / a_i) / a_i
+            a_i = (0.00633 * k_ref) / (w.phi_fi * self.p.mu * w.ct_fi * (self.L_ref ** 2))
+            s_d = s_dim / a_i
+            omega = (w.phi_fi * w.ct_fi) / max(1e-10, (w.phi_fi * w.ct_fi + w.phi_mi * w.ct_mi))
+            lambd = (w.sigma_i * w.k_mi * (self.L_ref ** 2)) / max(1e-10, w.k_fi)
+            cfd = (w.kf * w.wf) / max(1e-10, (w.k_fi * w.xf))
+            c_well_val = getattr(w, 'c_wellbore', 0.0)
+            c_d = (0.8936 * c_well_val) / (w.phi_fi * w.ct_fi * self.p.h * (self.L_ref ** 2))
+
+            pwd_self, alpha_i = self._unit_response(s_d, omega, lambd, cfd)
+            factor = scale / (w.n_f * a_i)
+            for j in range(self.n):
+                if j == i:
+                    resp = pwd_self
+                    if c_d > 0:
+                        resp = resp / (1.0 + c_d * (s_d ** 2) * resp)
+                else:
+                    dist_d = abs(self.wells[j].spacing * (j - i)) / self.L_ref
+                    resp = pwd_self * np.exp(-alpha_i * dist_d)
+                R[:, j, i] = factor * resp
+        return R
+
+    def _control_steps(self):
+        """
+        Clasifica cada pozo según su cronograma: control por presión si todos sus
+        escalones definen pwf_psi sin tasa; si no, control por tasa.
+        Devuelve (pressure_mask, steps) con steps[i] = [(t, cambio de tasa o de drawdown)].
+        """
+        pressure_mask = np.zeros(self.n, dtype=bool)
+        steps = []
+        for i, w in enumerate(self.wells):
+            sched = self.schedules.get(w.id, [])
+            by_pressure = bool(sched) and all(s.pwf_psi is not None and s.rate_stbd is None for s in sched)
+            pressure_mask[i] = by_pressure
+            well_steps, prev = [], 0.0
+            for s in sched:
+                # Bajo control por presión la variable superpuesta es el drawdown p_i - pwf
+                value = (self.p.initial_pressure - s.pwf_psi) if by_pressure else (s.rate_stbd or 0.0)
+                well_steps.append((s.time_days, value - prev))
+                prev = value
+            steps.append(well_steps)
+        return pressure_mask, steps
+
+    def has_pressure_control(self):
+        """True si algún pozo produce a pwf impuesta (ver _control_steps)."""
+        return bool(self._control_steps()[0].any())
+
+    def calculate_production(self, days_list, n_stehfest=12, abandonment_rate=None,
+                             abandonment_pressure=None, eur_horizon_days=10950.0,
+                             superposition="direct", grid_days=1.0, rate_tolerance=0.0):
+        """
+        Tasa, producción acumulada y presión por pozo en una única pasada de Laplace.
+
+        Los pozos con cronograma de pwf se resuelven a presión impuesta (acoplados por
+        interferencia con el resto) y los demás a tasa impuesta. Para cada s se arma la
+        matriz de respuestas, se resuelven las tasas desconocidas (q̄) y se invierten a la
+        vez q̄, q̄/s (acumulada) y Δp̄ con Stehfest (ver _laplace_production).
+
+        Con superposition="convolution" (solo pozos a tasa impuesta) la presión se obtiene
+        con el motor FFT de calculate_curve_convolution y la tasa y acumulada son las del
+        cronograma, fusionado con rate_tolerance igual que para la presión.
+
+        EUR (solo si se indica abandonment_rate o abandonment_pressure): acumulada al cruzar
+        abandonment_rate (pozos a presión impuesta) o abandonment_pressure (pozos a tasa
+        impuesta) después del último escalón del pozo, buscada hasta eur_horizon_days.
+        """
+        pressure_mask, steps = self._control_steps()
+        t_out = np.asarray(days_list, dtype=float)
+        want_eur = abandonment_rate is not None or abandonment_pressure is not None
+        t_eur = np.geomspace(max(1e-3, min(1.0, eur_horizon_days)), eur_horizon_days, 200) if want_eur else np.empty(0)
+
+        if superposition == "convolution":
+            if pressure_mask.any():
+                raise ValueError("La superposición por convolución solo admite pozos a tasa impuesta")
+            if want_eur:
+                # Tiempos de EUR sobre la grilla para que también los resuelva la FFT
+                t_eur = np.unique(np.maximum(1, np.rint(t_eur / grid_days)) * grid_days)
+            t_eval = np.concatenate([t_out, t_eur])
+            dp = self._convolution_delta_p(t_eval, n_stehfest, grid_days, rate_tolerance)
+            # Tasa y acumulada sobre la misma historia fusionada que usa la presión
+            steps = []
+            for well in self.wells:
+                q_steps = compress_rate_history(
+                    [(s.time_days, s.rate_stbd or 0.0) for s in self.schedules.get(well.id, [])], rate_tolerance)
+                dq = np.diff([0.0] + [q for _, q in q_steps])
+                steps.append([(t, d) for (t, _), d in zip(q_steps, dq)])
+            rate = np.zeros((self.n, len(t_eval)))
+            cum = np.zeros((self.n, len(t_eval)))
+            for i, well_steps in enumerate(steps):
+                if not well_steps:
+                    continue
+                t_k = np.array([t for t, _ in well_steps])
+                delta = np.array([d for _, d in well_steps])
+                elapsed = t_eval[:, None] - t_k[None, :]
+                rate[i] = (elapsed > 0) @ delta
+                cum[i] = np.maximum(elapsed, 0.0) @ delta
+        else:
+            t_eval = np.concatenate([t_out, t_eur])
+            rate, cum, dp = self._laplace_production(t_eval, steps, pressure_mask, n_stehfest)
+
+        n_out = len(t_out)
+        results = {w.name: {"pwf": [], "delta_p": [], "derivative": []} for w in self.wells}
+        temp_pwf = {}
+        eur = {}
+        for i, well in enumerate(self.wells):
+            pwf_eval = np.maximum(0, self.p.initial_pressure - dp[i])
+            temp_pwf[well.name] = np.round(pwf_eval[:n_out], 2).tolist()
+            if not want_eur:
+                continue
+
+            if pressure_mask[i]:
+                criterion, limit, signal = "rate", abandonment_rate, rate[i, n_out:]
+            else:
+                criterion, limit, signal = "pressure", abandonment_pressure, pwf_eval[n_out:]
+            if limit is None or not steps[i]:
+                criterion = None
+            last_step = max((t for t, _ in steps[i]), default=0.0)
+            eur[well.name] = self._eur(t_eval[n_out:], signal, cum[i, n_out:], limit, last_step, criterion)
+
+        out = self._build_results(days_list, temp_pwf, results)
+        for i, well in enumerate(self.wells):
+            curve = out["curves"][well.name]
+            curve["control"] = "pressure" if pressure_mask[i] else "rate"
+            curve["rate"] = np.round(rate[i, :n_out], 2).tolist()
+            curve["cumulative"] = np.round(cum[i, :n_out], 2).tolist()
+        out["eur"] = eur if want_eur else None
+        return out
+
+    def _laplace_unit_responses(self, dt_days, P, Q, v):
+        """
+        Respuestas en el tiempo (tasa, acumulada, Δp) de todos los pozos a un escalón
+        unitario en la variable controlada de cada pozo, para un lote de tiempos dt_days.
+        Devuelve tres arrays (len(dt_days), n_pozos salida, n_pozos entrada).
+        """
+        n_stehfest = len(v)
+        ln2_dt = np.log(2.0) / dt_days
+        s_dim = (np.arange(1, n_stehfest + 1)[None, :] * ln2_dt[:, None]).ravel()
+        R = self._laplace_response_matrix(s_dim)
+        s3 = s_dim[:, None, None]
+
+        # q̄ de todos los pozos por escalón unitario en la variable controlada de cada pozo
+        q_bar = np.zeros_like(R)
+        q_bar[:, Q, Q] = 1.0
+        if len(P):
+            rhs = np.zeros((len(s_dim), len(P), self.n))
+            rhs[:, :, Q] = -R[:, P][:, :, Q]
+            rhs[:, :, P] = np.eye(len(P)) / s_dim[:, None, None]
+            q_bar[:, P, :] = np.linalg.solve(R[:, P][:, :, P], rhs)
+        q_bar = q_bar / s3
+        dp_bar = s3 * (R @ q_bar)
+
+        def invert(f_bar):
+            f_bar = f_bar.reshape(len(dt_days), n_stehfest, self.n, self.n)
+            return np.einsum('k,dkji->dji', v, f_bar) * ln2_dt[:, None, None]
+
+        return invert(q_bar), invert(q_bar / s3), invert(dp_bar)
+
+    def _laplace_production(self, t_eval, steps, pressure_mask, n_stehfest):
+        """
+        Superposición en el tiempo de las respuestas de Laplace. Las respuestas se tabulan
+        sobre los tiempos transcurridos exactos o, si son demasiados (historias densas),
+        sobre una grilla logarítmica con interpolación lineal en ln(t). La tabla se arma
+        por lotes de LAPLACE_CHUNK tiempos y la superposición por lotes de SUPERPOSITION_PAIRS
+        pares, así que la memoria queda acotada aunque la historia sea densa.
+        """
+        v = self._get_stehfest_coeffs(n_stehfest)
+        P = np.flatnonzero(pressure_mask)
+        Q = np.flatnonzero(~pressure_mask)
+
+        step_times = np.unique([t for well_steps in steps for t, _ in well_steps])
+        rate = np.zeros((self.n, len(t_eval)))
+        cum = np.zeros((self.n, len(t_eval)))
+        dp = np.zeros((self.n, len(t_eval)))
+        if len(step_times) == 0 or t_eval.max() <= step_times[0]:
+            return rate, cum, dp
+
+        if len(t_eval) * len(step_times) <= MAX_EXACT_DT ** 2:
+            dt_needed = np.unique(t_eval[:, None] - step_times[None, :])
+            dt_needed = dt_needed[dt_needed > 0]
+        else:
+            dt_needed = None
+        if dt_needed is not None and len(dt_needed) <= MAX_EXACT_DT:
+            dt_table = dt_needed
+        else:
+            # Menor lapso positivo: de cada tiempo al último escalón anterior
+            prev = np.searchsorted(step_times, t_eval, side="left") - 1
+            dt_min = np.min(t_eval[prev >= 0] - step_times[prev[prev >= 0]])
+            dt_max = t_eval.max() - step_times[0]
+            n_log = int(np.ceil(np.log10(dt_max / dt_min) * LOG_POINTS_PER_DECADE)) + 2
+            dt_table = np.geomspace(dt_min, dt_max, n_log)
+
+        n_table = len(dt_table)
+        tables = [np.empty((n_table, self.n, self.n)) for _ in range(3)]
+        for a in range(0, n_table, LAPLACE_CHUNK):
+            b = min(a + LAPLACE_CHUNK, n_table)
+            for table, chunk in zip(tables, self._laplace_unit_responses(dt_table[a:b], P, Q, v)):
+                table[a:b] = chunk
+        rate_resp, cum_resp, dp_resp = tables
+
+        log_table = np.log(dt_table)
+        for i_in, well_steps in enumerate(steps):
+            if not well_steps:
+                continue
+            t_k = np.array([t for t, _ in well_steps])
+            delta = np.array([d for _, d in well_steps])
+            # Lotes de tiempos de salida para acotar la matriz de lapsos (tiempos x escalones)
+            block = max(1, SUPERPOSITION_PAIRS // len(t_k))
+            for a in range(0, len(t_eval), block):
+                t_blk = t_eval[a:a + block]
+                elapsed = t_blk[:, None] - t_k[None, :]
+                rows, cols = np.nonzero(elapsed > 0)
+                x = np.log(elapsed[rows, cols])
+
+                # Pesos de interpolación en ln(t) agrupados en una matriz (tiempos x tabla)
+                if n_table == 1:
+                    left = right = np.zeros(len(x), dtype=int)
+                    w = np.zeros(len(x))
+                else:
+                    right = np.clip(np.searchsorted(log_table, x), 1, n_table - 1)
+                    left = right - 1
+                    w = np.clip((x - log_table[left]) / (log_table[right] - log_table[left]), 0.0, 1.0)
+                size = len(t_blk) * n_table
+                weights = (np.bincount(rows * n_table + left, delta[cols] * (1.0 - w), minlength=size)
+                           + np.bincount(rows * n_table + right, delta[cols] * w, minlength=size))
+                weights = weights.reshape(len(t_blk), n_table)
+
+                rate[:, a:a + block] += (weights @ rate_resp[:, :, i_in]).T
+                cum[:, a:a + block] += (weights @ cum_resp[:, :, i_in]).T
+                dp[:, a:a + block] += (weights @ dp_resp[:, :, i_in]).T
+
+        return rate, cum, dp
+
+    def _eur(self, t_eur, signal, cum, limit, last_step, criterion):
+        """Acumulada al primer cruce de `limit` posterior al último escalón (interpolación lineal)."""
+        hit = np.flatnonzero((t_eur > last_step) & (signal <= limit)) if criterion else []
+        if len(hit) == 0:
+            return {"eur_stb": round(float(cum[-1]), 2), "abandonment_time_days": None,
+                    "criterion": criterion, "reached": False}
+        k = hit[0]
+        if k == 0 or signal[k - 1] == signal[k]:
+            t_ab, q_ab = t_eur[k], cum[k]
+        else:
+            frac = (signal[k - 1] - limit) / (signal[k - 1] - signal[k])
+            t_ab = t_eur[k - 1] + frac * (t_eur[k] - t_eur[k - 1])
+            q_ab = cum[k - 1] + frac * (cum[k] - cum[k - 1])
+        return {"eur_stb": round(float(q_ab), 2), "abandonment_time_days": round(float(t_ab), 2),
+                "criterion": criterion, "reached": True}
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlmodel import select, func
+
+from app.models import Well, ProductionSchedule
+from app.solver import TrilinearSolver
+
+load_dotenv()
+
+# Cantidad de proyectos más activos a pre-calentar al iniciar (0 = desactivado)
+PREWARM_PROJECTS = int(os.getenv("PREWARM_PROJECTS", "0"))
+
+
+class StartupTracker:
+    """
+    Mide el arranque en frío del proceso (desde la importación de la app hasta que
+    termina el hook de startup) y la latencia de la primera petición atendida.
+    """
+
+    def __init__(self, t0):
+        self.t0 = t0
+        self.cold_start_seconds = None
+        self.prewarm_seconds = None
+        self.prewarmed_projects = []
+        self.first_request = None
+
+    def mark_ready(self):
+        self.cold_start_seconds = round(time.perf_counter() - self.t0, 4)
+
+    def record_request(self, path, elapsed):
+        if self.first_request is None:
+            self.first_request = {"path": path, "latency_seconds": round(elapsed, 4)}
+
+    def stats(self):
+        return {
+            "cold_start_seconds": self.cold_start_seconds,
+            "prewarm_seconds": self.prewarm_seconds,
+            "prewarmed_projects": self.prewarmed_projects,
+            "first_request": self.first_request,
+        }
+
+
+class FirstRequestTimer:
+    """
+    Middleware ASGI mínimo que registra la latencia de la primera petición HTTP real
+    (los sondeos /health y /metrics no cuentan). Una vez registrada, solo delega.
+    """
+
+    IGNORED_PREFIXES = ("/health", "/metrics")
+
+    def __init__(self, app, tracker):
+        self.app = app
+        self.tracker = tracker
+
+    async def __call__(self, scope, receive, send):
+        if (self.tracker.first_request is not None or scope["type"] != "http"
+                or scope["path"].startswith(self.IGNORED_PREFIXES)):
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+
+        async def send_and_time(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                self.tracker.record_request(scope["path"], time.perf_counter() - started)
+
+        await self.app(scope, receive, send_and_time)
+
+
+async def prewarm_solver(session_factory, tracker, n_projects=PREWARM_PROJECTS):
+    """
+    Pre-calienta el solver con los proyectos con más escalones de producción:
+    coeficientes de Stehfest en caché y primera ejecución de NumPy/SciPy pagadas
+    antes de recibir tráfico. Cada proyecto se corre con el motor que elegiría
+    /curve por defecto (convolución para las historias densas).
+    """
+    if n_projects <= 0:
+        return
+    # Import diferido para evitar un ciclo con app.routes
+    from app.routes.simulation import load_project_with_schedules, choose_engine
+
+    started = time.perf_counter()
+
+    async with session_factory() as session:
+        res = await session.execute(
+            select(Well.project_id, func.count(ProductionSchedule.id).label("n_steps"))
+            .join(ProductionSchedule, ProductionSchedule.well_id == Well.id, isouter=True)
+            .group_by(Well.project_id)
+            .order_by(func.count(ProductionSchedule.id).desc())
+            .limit(n_projects)
+        )
+        project_ids = [row[0] for row in res.all()]
+
+        for project_id in project_ids:
+            try:
+                project, schedules_map = await load_project_with_schedules(project_id, session)
+                solver = TrilinearSolver(project, project.wells, schedules_map)
+                # Pocos puntos en escala log: suficiente para recorrer todo el camino del kernel
+                days = np.logspace(-2, 2, 8).tolist()
+                if choose_engine(solver, schedules_map, "auto", 1.0, max(days)) == "convolution":
+                    await asyncio.to_thread(solver.calculate_curve_convolution, days)
+                else:
+                    await asyncio.to_thread(solver.calculate_curve, days)
+            except Exception:
+                # Un proyecto inválido no debe impedir que el worker arranque
+                continue
+            tracker.prewarmed_projects.append(project_id)
+
+    tracker.prewarm_seconds = round(time.perf_counter() - started, 4)